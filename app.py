@@ -4,18 +4,30 @@ Provides a user-friendly interface for uploading EPUBs and reading books
 """
 
 import os
+import shutil
 import streamlit as st
 from pathlib import Path
 import tempfile
-from reader3 import process_epub, save_to_pickle, Book, BookMetadata, ChapterContent
-import pickle
-from typing import Optional, List
+from contextlib import contextmanager
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from reader3 import process_epub, save_to_pickle, load_metadata_sidecar, load_from_pickle, load_chapter, Book, BookMetadata, ChapterContent
+from reader3_constants import (
+    OPENAI_MODELS, OPENAI_MODEL_KEYS, OPENAI_MODEL_INFO,
+    GEMINI_MODELS, GEMINI_MODEL_KEYS, GEMINI_MODEL_INFO,
+    SESSION_DEFAULTS,
+)
+from reader3_pdf import get_pymupdf, extract_page_range
+from reader3_markdown import render_markdown
+from typing import Optional, List, Tuple
 from datetime import datetime
-import PyPDF2
-import markdown
-from markdown.extensions import codehilite, fenced_code, tables
 import re
 
+# Markdown header patterns
+_H1_RE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_H12_SPLIT_RE = re.compile(r'^(#{1,2}\s+.+)$', re.MULTILINE)
+
 # Page config
 st.set_page_config(
     page_title="Reader3 - Document Reader",
@@ -25,55 +37,23 @@ st.set_page_config(
 )
 
 # Custom CSS for better reading experience
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #2c3e50;
-        margin-bottom: 1rem;
-    }
-    .book-card {
-        padding: 1.5rem;
-        border-radius: 10px;
-        background: #f8f9fa;
-        border-left: 4px solid #3498db;
-        margin-bottom: 1rem;
-    }
-    .book-title {
-        font-size: 1.5rem;
-        font-weight: bold;
-        color: #2c3e50;
-    }
-    .book-meta {
-        color: #666;
-        font-size: 0.9rem;
-        margin-top: 0.5rem;
-    }
-    .chapter-content {
-        font-family: Georgia, serif;
-        font-size: 1.1rem;
-        line-height: 1.8;
-        text-align: justify;
-        max-width: 800px;
-        margin: 0 auto;
-    }
-    .stButton > button {
-        background-color: #3498db;
-        color: white;
-        border-radius: 5px;
-        padding: 0.5rem 1rem;
-        border: none;
-    }
-    .stButton > button:hover {
-        background-color: #2980b9;
-    }
-</style>
-""", unsafe_allow_html=True)
+CSS_PATH = Path(__file__).parent / "static" / "reader3.css"
+
+@st.cache_resource
+def _page_css() -> str:
+    """The page stylesheet, wrapped in a <style> tag for st.html"""
+    return f"<style>\n{CSS_PATH.read_text(encoding='utf-8')}</style>"
+
+st.html(_page_css())
 
 # Directory setup
 BOOKS_DIR = Path(".")
 
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _load_book_cached(folder_name: str, mtime: float) -> Book:
+    """Unpickle a book; mtime is part of the key, so superseded versions age out of the 8 entries"""
+    return load_from_pickle(str(BOOKS_DIR / folder_name))
+
 def load_book_from_folder(folder_name: str) -> Optional[Book]:
     """Load a book from its pickle file"""
     file_path = BOOKS_DIR / folder_name / "book.pkl"
@@ -81,47 +61,99 @@ def load_book_from_folder(folder_name: str) -> Optional[Book]:
         return None
 
     try:
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
+        mtime = file_path.stat().st_mtime
+        return _load_book_cached(folder_name, mtime)
     except Exception as e:
         st.error(f"Error loading book {folder_name}: {e}")
         return None
 
-def get_all_books():
-    """Scan directory for processed books"""
+def _dir_sig() -> Tuple[Tuple[str, float], ...]:
+    """Names and mtimes of the book folders; changes when a book is added, removed or reprocessed"""
+    if not BOOKS_DIR.exists():
+        return ()
+    sig = []
+    for item in BOOKS_DIR.iterdir():
+        if not item.name.endswith("_data"):
+            continue
+        try:
+            # A folder being swapped for a reprocessed copy can vanish between listing and stat
+            if item.is_dir():
+                sig.append((item.name, item.stat().st_mtime))
+        except FileNotFoundError:
+            continue
+    return tuple(sorted(sig))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _get_all_books_cached(sig: Tuple[Tuple[str, float], ...]):
+    """Read the meta.json sidecars of the folders in sig"""
     books = []
-    if BOOKS_DIR.exists():
-        for item in BOOKS_DIR.iterdir():
-            if item.is_dir() and item.name.endswith("_data"):
-                book = load_book_from_folder(item.name)
-                if book:
-                    books.append({
-                        "id": item.name,
-                        "title": book.metadata.title,
-                        "authors": book.metadata.authors,
-                        "chapters": len(book.spine),
-                        "book": book
-                    })
+    for name, _ in sig:
+        item = BOOKS_DIR / name
+        # Bypasses the resource cache so a backfill doesn't keep the full Book alive
+        try:
+            meta = load_metadata_sidecar(str(item))
+        except Exception as e:
+            st.error(f"Error loading book {name}: {e}")
+            continue
+        if meta is None:
+            continue
+
+        books.append({
+            "id": item.name,
+            "title": meta["title"],
+            "authors": meta["authors"],
+            "authors_display": ", ".join(meta["authors"]) or "Unknown Author",
+            "chapters": meta["n_chapters"]
+        })
     return books
 
-def process_pdf(pdf_path: str, output_dir: str, title: str) -> Book:
+def get_all_books():
+    """Scan directory for processed books; the directory signature is the cache key"""
+    return _get_all_books_cached(_dir_sig())
+
+@contextmanager
+def _open_pdf(pdf_path: str):
+    """Yield (num_pages, author, page_text) with PyMuPDF, or PyPDF2 when it isn't installed"""
+    pymupdf = get_pymupdf()
+    if pymupdf is not None:
+        with pymupdf.open(pdf_path) as doc:
+            # Already a plain dict of strings, with "" for missing fields
+            md = doc.metadata or {}
+            author = md.get("author") or "Unknown"
+            yield doc.page_count, author, lambda n: doc[n].get_text("text")
+    else:
+        import PyPDF2
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            info = pdf_reader.metadata
+            # str() drops PyPDF2's TextStringObject, which book.pkl mustn't reference
+            author = str(info.author) if info and info.author else "Unknown"
+            yield len(pdf_reader.pages), author, lambda n: pdf_reader.pages[n].extract_text()
+
+# Below this many pages, starting worker processes costs more than it saves
+PARALLEL_PDF_MIN_PAGES = 200
+
+def _extract_ranges_parallel(pdf_path: str, page_ranges: List[Tuple[int, int]]) -> List[str]:
+    """Extract each (lo, hi) page range in a separate process, returned in order"""
+    workers = min(os.cpu_count() or 1, len(page_ranges))
+    # spawn, not fork: this runs on a background thread of a threaded server
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(
+            extract_page_range,
+            [(pdf_path, lo, hi) for lo, hi in page_ranges],
+            chunksize=max(1, len(page_ranges) // (workers * 4))
+        ))
+
+def process_pdf(pdf_path: str, title: str) -> Book:
     """Process a PDF file into Book format"""
-    # Create output directory
-    if os.path.exists(output_dir):
-        import shutil
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-
     # Read PDF
-    with open(pdf_path, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        num_pages = len(pdf_reader.pages)
-
+    with _open_pdf(pdf_path) as (num_pages, author, page_text):
         # Extract metadata
         metadata = BookMetadata(
             title=title,
             language="en",
-            authors=[pdf_reader.metadata.author] if pdf_reader.metadata and pdf_reader.metadata.author else ["Unknown"],
+            authors=[author],
             description=f"PDF document with {num_pages} pages",
             publisher=None,
             date=datetime.now().isoformat(),
@@ -132,17 +164,20 @@ def process_pdf(pdf_path: str, output_dir: str, title: str) -> Book:
         # Process pages into chapters (group every 10 pages)
         spine = []
         pages_per_chapter = 10
+        page_ranges = [
+            (i, min(i + pages_per_chapter, num_pages))
+            for i in range(0, num_pages, pages_per_chapter)
+        ]
 
-        for i in range(0, num_pages, pages_per_chapter):
-            chapter_pages = []
-            end_page = min(i + pages_per_chapter, num_pages)
-
-            for page_num in range(i, end_page):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                chapter_pages.append(text)
+        if get_pymupdf() is not None and num_pages >= PARALLEL_PDF_MIN_PAGES:
+            chapter_texts = _extract_ranges_parallel(pdf_path, page_ranges)
+        else:
+            chapter_texts = (
+                "\n\n".join(page_text(page_num) for page_num in range(lo, hi))
+                for lo, hi in page_ranges
+            )
 
-            chapter_text = "\n\n".join(chapter_pages)
+        for (i, end_page), chapter_text in zip(page_ranges, chapter_texts):
             chapter_html = f"<div style='white-space: pre-wrap;'>{chapter_text}</div>"
 
             chapter = ChapterContent(
@@ -150,7 +185,6 @@ def process_pdf(pdf_path: str, output_dir: str, title: str) -> Book:
                 href=f"chapter_{i//pages_per_chapter}.html",
                 title=f"Pages {i+1}-{end_page}",
                 content=chapter_html,
-                text=chapter_text,
                 order=i//pages_per_chapter
             )
             spine.append(chapter)
@@ -167,25 +201,19 @@ def process_pdf(pdf_path: str, output_dir: str, title: str) -> Book:
 
     return book
 
-def process_markdown(md_path: str, output_dir: str, title: str) -> Book:
-    """Process a Markdown file into Book format"""
-    # Create output directory
-    if os.path.exists(output_dir):
-        import shutil
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
+def process_markdown(md_bytes: bytes, title: str, source_file: str) -> Book:
+    """Process an uploaded Markdown file's bytes into Book format"""
+    md_content = md_bytes.decode('utf-8', errors='replace')
 
-    # Read Markdown file
-    with open(md_path, 'r', encoding='utf-8') as file:
-        md_content = file.read()
+    # Find the headers (h1 and h2) in one pass; chapters are the text between them
+    headers = list(_H12_SPLIT_RE.finditer(md_content))
 
     # Extract title from first h1 if exists
-    first_h1 = re.search(r'^#\s+(.+)$', md_content, re.MULTILINE)
-    if first_h1:
-        title = first_h1.group(1)
-
-    # Split by headers (h1 and h2)
-    sections = re.split(r'^(#{1,2}\s+.+)$', md_content, flags=re.MULTILINE)
+    for header in headers:
+        first_h1 = _H1_RE.match(header.group(1))
+        if first_h1:
+            title = first_h1.group(1)
+            break
 
     # Create metadata
     metadata = BookMetadata(
@@ -199,72 +227,37 @@ def process_markdown(md_path: str, output_dir: str, title: str) -> Book:
         subjects=[]
     )
 
-    # Process sections into chapters
-    spine = []
-    current_title = "Introduction"
-    current_content = []
-    chapter_idx = 0
-
-    for i, section in enumerate(sections):
-        if i == 0 and section.strip():
-            # Content before first header
-            current_content.append(section)
-        elif section.startswith('#'):
-            # Save previous chapter if exists
-            if current_content:
-                md_text = ''.join(current_content)
-                html_content = markdown.markdown(
-                    md_text,
-                    extensions=['fenced_code', 'tables', 'codehilite']
-                )
-
-                chapter = ChapterContent(
-                    id=f"chapter_{chapter_idx}",
-                    href=f"chapter_{chapter_idx}.html",
-                    title=current_title,
-                    content=html_content,
-                    text=md_text,
-                    order=chapter_idx
-                )
-                spine.append(chapter)
-                chapter_idx += 1
-
-            # Start new chapter
-            current_title = section.strip('#').strip()
-            current_content = []
-        else:
-            current_content.append(section)
-
-    # Add last chapter
-    if current_content:
-        md_text = ''.join(current_content)
-        html_content = markdown.markdown(
-            md_text,
-            extensions=['fenced_code', 'tables', 'codehilite']
-        )
+    # Process sections into chapters, as (title, start, end) slices of md_content
+    sections = []
+    intro_end = headers[0].start() if headers else len(md_content)
+    if md_content[:intro_end].strip():
+        # Content before first header
+        sections.append(("Introduction", 0, intro_end))
+    section_ends = [header.start() for header in headers[1:]] + [len(md_content)]
+    sections.extend(
+        (header.group(1).strip('#').strip(), header.end(), end)
+        for header, end in zip(headers, section_ends)
+    )
 
+    spine = []
+    for chapter_idx, (chapter_title, start, end) in enumerate(sections):
         chapter = ChapterContent(
             id=f"chapter_{chapter_idx}",
             href=f"chapter_{chapter_idx}.html",
-            title=current_title,
-            content=html_content,
-            text=md_text,
+            title=chapter_title,
+            content=render_markdown(md_content[start:end]),
             order=chapter_idx
         )
         spine.append(chapter)
 
     # If no chapters were created, make one from entire content
     if not spine:
-        html_content = markdown.markdown(
-            md_content,
-            extensions=['fenced_code', 'tables', 'codehilite']
-        )
+        html_content = render_markdown(md_content)
         chapter = ChapterContent(
             id="chapter_0",
             href="chapter_0.html",
             title=title,
             content=html_content,
-            text=md_content,
             order=0
         )
         spine.append(chapter)
@@ -275,60 +268,156 @@ def process_markdown(md_path: str, output_dir: str, title: str) -> Book:
         spine=spine,
         toc=[],
         images={},
-        source_file=os.path.basename(md_path),
+        source_file=source_file,
         processed_at=datetime.now().isoformat()
     )
 
     return book
 
-def process_uploaded_file(uploaded_file):
-    """Process an uploaded file (EPUB, PDF, or Markdown)"""
+@st.cache_resource
+def _get_executor() -> ThreadPoolExecutor:
+    """One pool per server process"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def _sibling_dir(output_dir: str, tag: str) -> str:
+    """
+    A fresh, uniquely named folder next to output_dir, e.g. foo_data.new-k3j2.
+    Unique so concurrent or back-to-back jobs for the same book never share one;
+    the library only lists folders ending in _data, so these stay hidden.
+    """
+    path = tempfile.mkdtemp(dir=str(BOOKS_DIR), prefix=f"{os.path.basename(output_dir)}.{tag}-")
+    # mkdtemp creates it 0700; it becomes the book folder, so give it normal permissions
+    os.chmod(path, 0o755)
+    return path
+
+@st.cache_resource
+def _sweep_swap_leftovers():
+    """
+    Remove staging and set-aside folders left behind when the server stopped
+    mid-job or before the background delete finished. Runs once per server process.
+    """
+    for pattern in ("*_data.new-*", "*_data.old-*"):
+        for item in BOOKS_DIR.glob(pattern):
+            shutil.rmtree(item, ignore_errors=True)
+
+def _save_book(book: Book, staging_dir: str, output_dir: str):
+    """
+    Save a book into its staging folder, then rename it over output_dir.
+    The previous copy is renamed aside and deleted on a daemon thread, so
+    readers never see a half-written folder and the worker doesn't wait on rmtree.
+    """
+    aside_dir = None
+    try:
+        save_to_pickle(book, staging_dir)
+        # A rename can't replace a non-empty directory, so move the old one aside first
+        if os.path.exists(output_dir):
+            aside_dir = _sibling_dir(output_dir, "old")
+            os.rename(output_dir, os.path.join(aside_dir, "book"))
+        try:
+            os.rename(staging_dir, output_dir)
+        except OSError:
+            if aside_dir is not None:
+                # Put the previous copy back
+                os.rename(os.path.join(aside_dir, "book"), output_dir)
+            raise
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        # Only remove the aside folder once it no longer holds the live copy
+        if aside_dir is not None and not os.listdir(aside_dir):
+            os.rmdir(aside_dir)
+        raise
+
+    if aside_dir is not None:
+        threading.Thread(target=shutil.rmtree, args=(aside_dir,), kwargs={"ignore_errors": True}, daemon=True).start()
+    return book, output_dir
+
+def _process_saved_file(tmp_path: str, file_extension: str, output_dir: str, base_name: str):
+    """Parse and save a document; runs on the worker pool, so no st.* calls here"""
+    staging_dir = _sibling_dir(output_dir, "new")
+    try:
+        if file_extension == '.epub':
+            book = process_epub(tmp_path, staging_dir)
+        elif file_extension == '.pdf':
+            book = process_pdf(tmp_path, base_name)
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    finally:
+        # Clean up temp file
+        os.unlink(tmp_path)
+
+    return _save_book(book, staging_dir, output_dir)
+
+def _process_markdown_upload(md_bytes: bytes, output_dir: str, base_name: str, source_file: str):
+    """Parse and save a Markdown upload; runs on the worker pool, so no st.* calls here"""
+    book = process_markdown(md_bytes, base_name, source_file)
+    return _save_book(book, _sibling_dir(output_dir, "new"), output_dir)
+
+def process_uploaded_file(uploaded_file) -> Future:
+    """Process an uploaded file (EPUB, PDF, or Markdown) in the background"""
     file_extension = Path(uploaded_file.name).suffix.lower()
     base_name = Path(uploaded_file.name).stem
     output_dir = str(BOOKS_DIR / f"{base_name}_data")
 
+    # Markdown is parsed from memory; only the EPUB and PDF parsers need a file path
+    if file_extension in ['.md', '.markdown']:
+        return _get_executor().submit(
+            _process_markdown_upload, uploaded_file.getvalue(), output_dir, base_name, uploaded_file.name
+        )
+
     # Save uploaded file temporarily
     suffix = file_extension
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-        tmp_file.write(uploaded_file.read())
+        # Copy in 1 MiB chunks
+        shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
         tmp_path = tmp_file.name
 
-    try:
-        with st.spinner(f"Processing {uploaded_file.name}..."):
-            if file_extension == '.epub':
-                book = process_epub(tmp_path, output_dir)
-            elif file_extension == '.pdf':
-                book = process_pdf(tmp_path, output_dir, base_name)
-            elif file_extension in ['.md', '.markdown']:
-                book = process_markdown(tmp_path, output_dir, base_name)
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-
-            save_to_pickle(book, output_dir)
-
-        return book, output_dir
-    finally:
-        # Clean up temp file
-        os.unlink(tmp_path)
+    return _get_executor().submit(_process_saved_file, tmp_path, file_extension, output_dir, base_name)
 
-def display_chapter(book: Book, chapter_index: int):
-    """Display a chapter with navigation"""
-    if chapter_index < 0 or chapter_index >= len(book.spine):
-        st.error("Chapter not found")
+def _show_library():
+    """Switch to the library view, rescanning the book folders on the way in"""
+    st.session_state.view = "library"
+    st.session_state.library_dirty = True
+
+@st.fragment(run_every=1)
+def _processing_status():
+    """Poll the background job; switch to the library once it finishes"""
+    future = st.session_state.processing_future
+    if not future.done():
+        st.info(f"⏳ Processing {st.session_state.processing_name}...")
         return
 
-    current_chapter = book.spine[chapter_index]
+    del st.session_state.processing_future
+    try:
+        book, output_dir = future.result()
+        st.toast(f"✓ Successfully processed: {book.metadata.title} (saved to {output_dir})")
+        # Refresh the view
+        _show_library()
+    except Exception as e:
+        import traceback
+        st.session_state.processing_error = (f"Error processing file: {e}", traceback.format_exc())
+    st.rerun()
 
-    # Chapter navigation
+def _go_to_chapter(index: int):
+    # Runs as an on_click callback, before the fragment reruns with the new index
+    st.session_state.current_chapter = index
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_chapter_content(book_id: str, chapter_index: int, processed_at: str, _book: Book) -> str:
+    """Load a single chapter's HTML; processed_at keeps reprocessed books from hitting stale entries"""
+    return load_chapter(str(BOOKS_DIR / book_id), _book, chapter_index).content
+
+def _render_nav(book: Book, chapter_index: int, key_suffix: str):
+    """Previous / section counter / Next row"""
     col1, col2, col3 = st.columns([1, 2, 1])
 
     with col1:
         if chapter_index > 0:
-            if st.button("← Previous"):
-                st.session_state.current_chapter = chapter_index - 1
-                st.rerun()
+            st.button("← Previous", key=f"prev_{key_suffix}", on_click=_go_to_chapter, args=(chapter_index - 1,))
         else:
-            st.button("← Previous", disabled=True)
+            st.button("← Previous", key=f"prev_{key_suffix}", disabled=True)
 
     with col2:
         st.markdown(f"<div style='text-align: center; padding: 0.5rem;'>Section {chapter_index + 1} of {len(book.spine)}</div>",
@@ -336,74 +425,75 @@ def display_chapter(book: Book, chapter_index: int):
 
     with col3:
         if chapter_index < len(book.spine) - 1:
-            if st.button("Next →"):
-                st.session_state.current_chapter = chapter_index + 1
-                st.rerun()
+            st.button("Next →", key=f"next_{key_suffix}", on_click=_go_to_chapter, args=(chapter_index + 1,))
         else:
-            st.button("Next →", disabled=True)
+            st.button("Next →", key=f"next_{key_suffix}", disabled=True)
 
-    st.divider()
+# Chapters shorter than this get no bottom nav row
+BOTTOM_NAV_MIN_CHARS = 4000
 
-    # Display chapter content
-    st.markdown(f'<div class="chapter-content">{current_chapter.content}</div>',
-               unsafe_allow_html=True)
+def display_chapter(book_id: str, book: Book, chapter_index: int):
+    """Display a chapter with navigation"""
+    if chapter_index < 0 or chapter_index >= len(book.spine):
+        st.error("Chapter not found")
+        return
+
+    # Chapter navigation
+    _render_nav(book, chapter_index, key_suffix="top")
 
     st.divider()
 
+    # Display chapter content
+    content = get_chapter_content(book_id, chapter_index, book.processed_at, book)
+    # Already HTML, so st.html renders it without the markdown parser
+    st.html(f'<div class="chapter-content">{content}</div>')
+
     # Bottom navigation
-    col1, col2, col3 = st.columns([1, 2, 1])
+    if len(content) > BOTTOM_NAV_MIN_CHARS:
+        st.divider()
+        _render_nav(book, chapter_index, key_suffix="bottom")
+
+def flatten_toc(book: Book) -> List[Tuple[int, str, int]]:
+    """Pre-order walk of the TOC into (depth, title, spine_idx) rows, done once per book"""
+    # PDF and Markdown books have no TOC; their spine titles serve as one
+    if not book.toc:
+        return [(0, chapter.title, i) for i, chapter in enumerate(book.spine)]
+
+    # TOC entries point at files; book.spine_index maps them to spine positions
+    href_to_spine = book.spine_index
+    flat = []
+    stack = [(0, item) for item in reversed(book.toc)]
+    while stack:
+        depth, item = stack.pop()
+        spine_idx = href_to_spine.get(item.file_href)
+        # Entries without a matching spine file have nowhere to jump to; their
+        # children take their place at the same depth
+        if spine_idx is not None:
+            flat.append((depth, item.title, spine_idx))
+            child_depth = depth + 1
+        else:
+            child_depth = depth
+        stack.extend((child_depth, child) for child in reversed(item.children))
+    return flat
 
-    with col1:
-        if chapter_index > 0:
-            if st.button("← Previous", key="prev_bottom"):
-                st.session_state.current_chapter = chapter_index - 1
-                st.rerun()
+def _jump_to_toc_entry():
+    """on_change for the TOC selectbox: open the picked chapter, then clear the box"""
+    pos = st.session_state.toc_jump
+    if pos is not None:
+        st.session_state.current_chapter = st.session_state._flat_toc[pos][2]
+    st.session_state.toc_jump = None
 
-    with col3:
-        if chapter_index < len(book.spine) - 1:
-            if st.button("Next →", key="next_bottom"):
-                st.session_state.current_chapter = chapter_index + 1
-                st.rerun()
-
-# Model configurations
-OPENAI_MODELS = {
-    "GPT-5.1 (Reasoning + Agentic)": "gpt-5.1",
-    "GPT-5 Mini": "gpt-5-mini",
-    "GPT-5 Nano": "gpt-5-nano",
-    "GPT-4.1": "gpt-4.1",
-    "GPT-4.1 Mini": "gpt-4.1-mini",
-    "GPT-4.1 Nano": "gpt-4.1-nano",
-    "GPT-4o": "gpt-4o",
-    "GPT-4o Mini": "gpt-4o-mini",
-    "o3 (Reasoning)": "o3",
-    "o4-mini (Reasoning)": "o4-mini",
-    "o4-mini-high (Reasoning)": "o4-mini-high",
-}
-
-GEMINI_MODELS = {
-    "Gemini 3 Pro (Preview)": "gemini-3-pro-preview",
-    "Gemini 2.5 Pro": "gemini-2.5-pro",
-    "Gemini 2.5 Flash": "gemini-2.5-flash",
-    "Gemini 2.5 Flash-Lite": "gemini-2.5-flash-lite",
-    "Gemini 2.0 Flash": "gemini-2.0-flash",
-    "Gemini 2.0 Flash-Lite": "gemini-2.0-flash-lite",
-}
+@st.fragment
+def _chapter_fragment(book_id: str, book: Book):
+    """Chapter pane; prev/next clicks rerun only this fragment, not the sidebar/TOC"""
+    # Fragment reruns reuse the original arguments, so read the index from state
+    display_chapter(book_id, book, st.session_state.current_chapter)
+
+_sweep_swap_leftovers()
 
 # Initialize session state
-if 'openai_api_key' not in st.session_state:
-    st.session_state.openai_api_key = ""
-if 'gemini_api_key' not in st.session_state:
-    st.session_state.gemini_api_key = ""
-if 'ai_provider' not in st.session_state:
-    st.session_state.ai_provider = "OpenAI"
-if 'selected_model' not in st.session_state:
-    st.session_state.selected_model = ""
-if 'current_book' not in st.session_state:
-    st.session_state.current_book = None
-if 'current_chapter' not in st.session_state:
-    st.session_state.current_chapter = 0
-if 'view' not in st.session_state:
-    st.session_state.view = "library"
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
 
 # Sidebar
 with st.sidebar:
@@ -435,35 +525,16 @@ with st.sidebar:
             st.success("✓ OpenAI API key configured")
 
         # Model selection
-        model_display_names = list(OPENAI_MODELS.keys())
         selected_model_display = st.selectbox(
             "Select Model",
-            model_display_names,
+            OPENAI_MODEL_KEYS,
             help="Choose the OpenAI model to use"
         )
         st.session_state.selected_model = OPENAI_MODELS[selected_model_display]
 
         # Model info
         with st.expander("ℹ️ Model Information"):
-            st.markdown("""
-            **GPT-5 Family** (Latest): Best for coding and agentic tasks
-            - GPT-5.1: Top model with configurable reasoning effort for complex tasks
-            - GPT-5 Mini: Faster, cost-efficient for well-defined tasks
-            - GPT-5 Nano: Fastest, most cost-efficient version
-
-            **GPT-4.1 Family**: Improved coding and instruction following
-            - GPT-4.1: Full-featured flagship model
-            - GPT-4.1 Mini: Faster, cost-effective version
-            - GPT-4.1 Nano: Ultra-fast, budget-friendly
-
-            **GPT-4o Family**: Multimodal models with native vision
-            - GPT-4o: Versatile omni-model
-            - GPT-4o Mini: Quick and economical
-
-            **O-Series**: Advanced reasoning models
-            - Specialized for complex problem-solving
-            - Strong in science, coding, and math
-            """)
+            st.markdown(OPENAI_MODEL_INFO)
 
     else:  # Google Gemini
         gemini_key = st.text_input(
@@ -477,35 +548,16 @@ with st.sidebar:
             st.success("✓ Gemini API key configured")
 
         # Model selection
-        model_display_names = list(GEMINI_MODELS.keys())
         selected_model_display = st.selectbox(
             "Select Model",
-            model_display_names,
+            GEMINI_MODEL_KEYS,
             help="Choose the Gemini model to use"
         )
         st.session_state.selected_model = GEMINI_MODELS[selected_model_display]
 
         # Model info
         with st.expander("ℹ️ Model Information"):
-            st.markdown("""
-            **Gemini 3 Pro (Preview)**: Latest flagship model
-            - 1M token input / 64k token output
-            - Advanced reasoning with dynamic thinking
-            - Knowledge cutoff: January 2025
-            - Supports tools: Google Search, Code Execution
-            - Best for complex tasks requiring broad world knowledge
-
-            **Gemini 2.5 Family**: State-of-the-art performance
-            - Pro: Top thinking model
-            - Flash: Best price-performance
-            - Flash-Lite: Ultra-fast and cost-efficient
-
-            **Gemini 2.0 Family**: Second-gen workhorse
-            - Flash: Balanced performance
-            - Flash-Lite: Lightweight variant
-
-            All models support text, image, video, audio, and PDF inputs
-            """)
+            st.markdown(GEMINI_MODEL_INFO)
 
     # Display current configuration
     if st.session_state.selected_model:
@@ -525,24 +577,23 @@ with st.sidebar:
         file_type = Path(uploaded_file.name).suffix.upper()
         st.info(f"📄 Selected: {uploaded_file.name} ({file_type})")
 
-        if st.button("Process Document"):
-            try:
-                book, output_dir = process_uploaded_file(uploaded_file)
-                st.success(f"✓ Successfully processed: {book.metadata.title}")
-                st.info(f"Saved to: {output_dir}")
-                # Refresh the view
-                st.session_state.view = "library"
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error processing file: {e}")
-                import traceback
-                st.error(traceback.format_exc())
+        if st.button("Process Document", disabled="processing_future" in st.session_state):
+            st.session_state.processing_future = process_uploaded_file(uploaded_file)
+            st.session_state.processing_name = uploaded_file.name
+
+    if "processing_future" in st.session_state:
+        _processing_status()
+
+    if "processing_error" in st.session_state:
+        message, details = st.session_state.pop("processing_error")
+        st.error(message)
+        st.error(details)
 
     st.markdown("---")
 
     # Navigation
     if st.button("🏠 Library"):
-        st.session_state.view = "library"
+        _show_library()
         st.session_state.current_book = None
         st.rerun()
 
@@ -563,7 +614,11 @@ with st.sidebar:
 if st.session_state.view == "library":
     st.markdown('<div class="main-header">📖 My Library</div>', unsafe_allow_html=True)
 
-    books = get_all_books()
+    # Rescan only when a book was added or the user asked for the library again
+    if st.session_state.library_dirty:
+        st.session_state.library_cache = get_all_books()
+        st.session_state.library_dirty = False
+    books = st.session_state.library_cache
 
     if not books:
         st.info("No documents in your library yet. Upload a file to get started!")
@@ -579,35 +634,45 @@ if st.session_state.view == "library":
         - 📝 Markdown files: Documentation, notes, technical guides
         """)
     else:
-        # Display books in a grid
-        cols_per_row = 2
-        for i in range(0, len(books), cols_per_row):
-            cols = st.columns(cols_per_row)
-            for j, col in enumerate(cols):
-                if i + j < len(books):
-                    book_data = books[i + j]
-                    with col:
-                        with st.container():
-                            st.markdown(f"""
-                            <div class="book-card">
-                                <div class="book-title">{book_data['title']}</div>
-                                <div class="book-meta">
-                                    {', '.join(book_data['authors']) if book_data['authors'] else 'Unknown Author'}<br>
-                                    {book_data['chapters']} sections
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                            if st.button(f"Read Book", key=f"read_{book_data['id']}"):
-                                st.session_state.current_book = book_data['id']
-                                st.session_state.current_chapter = 0
-                                st.session_state.view = "reader"
-                                st.rerun()
+        # One table widget for the whole library; selecting a row opens the book
+        event = st.dataframe(
+            books,
+            column_order=("title", "authors_display", "chapters"),
+            column_config={
+                "title": st.column_config.TextColumn("Title"),
+                "authors_display": st.column_config.TextColumn("Authors"),
+                "chapters": st.column_config.NumberColumn("Sections"),
+            },
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+        )
+        st.caption("Select a row to start reading.")
+
+        if event.selection.rows:
+            st.session_state.current_book = books[event.selection.rows[0]]['id']
+            st.session_state.current_chapter = 0
+            st.session_state.view = "reader"
+            st.rerun()
 
 elif st.session_state.view == "reader" and st.session_state.current_book:
+    # A cache hit until book.pkl's mtime changes
     book = load_book_from_folder(st.session_state.current_book)
 
     if book:
+        # Rebuild the TOC rows only for a new book, or the same one reprocessed
+        toc_key = (st.session_state.current_book, book.processed_at)
+        if st.session_state.get("_toc_key") != toc_key:
+            st.session_state._toc_key = toc_key
+            st.session_state._flat_toc = flatten_toc(book)
+            # Selectbox labels, indented by depth
+            st.session_state._toc_labels = [
+                "\u00a0" * (depth * 4) + title for depth, title, _ in st.session_state._flat_toc
+            ]
+        # A reprocessed book may have fewer sections than the one being read
+        if st.session_state.current_chapter >= len(book.spine):
+            st.session_state.current_chapter = 0
+
         # Book header
         st.markdown(f'<div class="main-header">{book.metadata.title}</div>', unsafe_allow_html=True)
         if book.metadata.authors:
@@ -615,37 +680,27 @@ elif st.session_state.view == "reader" and st.session_state.current_book:
 
         st.divider()
 
-        # Table of contents in sidebar
-        with st.sidebar:
-            st.markdown("---")
-            st.markdown("#### Table of Contents")
-
-            def render_toc(items, depth=0):
-                for item in items:
-                    # Find matching spine index
-                    spine_idx = None
-                    for i, ch in enumerate(book.spine):
-                        if ch.href == item.file_href:
-                            spine_idx = i
-                            break
-
-                    indent = "&nbsp;" * (depth * 4)
-                    if spine_idx is not None:
-                        if st.button(f"{item.title}", key=f"toc_{item.href}_{depth}"):
-                            st.session_state.current_chapter = spine_idx
-                            st.rerun()
-                    else:
-                        st.markdown(f"{indent}{item.title}")
-
-                    if item.children:
-                        render_toc(item.children, depth + 1)
-
-            render_toc(book.toc)
+        # Table of contents in sidebar; one widget for the whole TOC, whose
+        # options are positions in _flat_toc
+        if st.session_state._flat_toc:
+            with st.sidebar:
+                st.markdown("---")
+                st.markdown("#### Table of Contents")
+                st.selectbox(
+                    "Jump to section",
+                    range(len(st.session_state._flat_toc)),
+                    index=None,
+                    format_func=st.session_state._toc_labels.__getitem__,
+                    placeholder="Choose a section...",
+                    key="toc_jump",
+                    on_change=_jump_to_toc_entry,
+                    label_visibility="collapsed"
+                )
 
         # Display current chapter
-        display_chapter(book, st.session_state.current_chapter)
+        _chapter_fragment(st.session_state.current_book, book)
     else:
         st.error("Could not load book")
         if st.button("Return to Library"):
-            st.session_state.view = "library"
+            _show_library()
             st.rerun()
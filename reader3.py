@@ -3,14 +3,20 @@ Parses an EPUB file into a structured object that can be used to serve the book
 """
 
 import os
+import gc
+import io
+import json
+import mmap
 import pickle
 import shutil
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+from functools import cached_property
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from urllib.parse import unquote
 
 import ebooklib
+import zstandard
 from ebooklib import epub
 from bs4 import BeautifulSoup, Comment
 
@@ -25,8 +31,7 @@ class ChapterContent:
     id: str           # Internal ID (e.g., 'item_1')
     href: str         # Filename (e.g., 'part01.html')
     title: str        # Best guess title from file
-    content: str      # Cleaned HTML with rewritten image paths
-    text: str         # Plain text for search/LLM context
+    content: str      # Cleaned HTML with rewritten image paths (empty once saved, see chapters/)
     order: int        # Linear reading order
 
 
@@ -57,7 +62,7 @@ class BookMetadata:
 class Book:
     """The Master Object to be pickled."""
     metadata: BookMetadata
-    spine: List[ChapterContent]  # The actual content (linear files)
+    spine: List[ChapterContent]  # The linear files; once saved, content is empty (see load_chapter)
     toc: List[TOCEntry]          # The navigation tree
     images: Dict[str, str]       # Map: original_path -> local_path
 
@@ -66,6 +71,11 @@ class Book:
     processed_at: str
     version: str = "3.0"
 
+    @cached_property
+    def spine_index(self) -> Dict[str, int]:
+        """Map: chapter href -> spine position, built on first use"""
+        return {ch.href: i for i, ch in enumerate(self.spine)}
+
 
 # --- Utilities ---
 
@@ -265,7 +275,6 @@ def process_epub(epub_path: str, output_dir: str) -> Book:
                 href=item.get_name(), # Important: This links TOC to Content
                 title=f"Section {i+1}", # Fallback, real titles come from TOC
                 content=final_html,
-                text=extract_plain_text(soup),
                 order=i
             )
             spine_chapters.append(chapter)
@@ -283,12 +292,141 @@ def process_epub(epub_path: str, output_dir: str) -> Book:
     return final_book
 
 
+def chapter_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, 'chapters', f'{index:04d}.html.zst')
+
+
+def load_chapter_html(output_dir: str, index: int) -> Optional[str]:
+    """
+    Reads a single chapter's HTML from chapters/.
+    Returns None for books saved before chapters were split out of book.pkl.
+    """
+    path = chapter_path(output_dir, index)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return zstandard.ZstdDecompressor().decompress(f.read()).decode('utf-8')
+
+
+def load_chapter(output_dir: str, book: Book, index: int) -> ChapterContent:
+    """
+    A spine item with its HTML filled in, reading only that chapter's file.
+    Books saved before the split still carry their HTML inside book.pkl.
+    """
+    chapter = book.spine[index]
+    html = load_chapter_html(output_dir, index)
+    if html is None:
+        return chapter
+    return replace(chapter, content=html)
+
+
 def save_to_pickle(book: Book, output_dir: str):
+    # One zstd-compressed file per spine item, so the reader only loads what it shows
+    os.makedirs(os.path.join(output_dir, 'chapters'), exist_ok=True)
+    cctx = zstandard.ZstdCompressor(level=3)
+    for i, chapter in enumerate(book.spine):
+        with open(chapter_path(output_dir, i), 'wb') as f:
+            f.write(cctx.compress(chapter.content.encode('utf-8')))
+
+    # The pickle keeps the spine as a lightweight index without the HTML
     p_path = os.path.join(output_dir, 'book.pkl')
-    with open(p_path, 'wb') as f:
-        pickle.dump(book, f)
+    stored = replace(book, spine=[replace(ch, content="") for ch in book.spine])
+    # Write then rename, so a reader never sees a half-written pickle
+    tmp_path = p_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(cctx.compress(pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL)))
+    os.replace(tmp_path, p_path)
     print(f"Saved structured data to {p_path}")
 
+    save_metadata(book, output_dir)
+
+
+def _metadata_summary(book: Book) -> Dict[str, Any]:
+    return {
+        "title": book.metadata.title,
+        "authors": book.metadata.authors,
+        "n_chapters": len(book.spine),
+    }
+
+
+def save_metadata(book: Book, output_dir: str) -> Dict[str, Any]:
+    """Small meta.json sidecar so the library view can list books without unpickling them."""
+    meta = _metadata_summary(book)
+    meta_path = os.path.join(output_dir, 'meta.json')
+    # Write then rename, so a listing never reads a truncated file
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+def load_metadata_sidecar(output_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Title/authors/chapter count from meta.json, without touching book.pkl.
+    Books saved before the sidecar existed get it backfilled when the folder is writable.
+    Returns None if the folder holds no book.
+    """
+    meta_path = os.path.join(output_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if not os.path.exists(os.path.join(output_dir, 'book.pkl')):
+        return None
+    book = load_from_pickle(output_dir)
+    try:
+        return save_metadata(book, output_dir)
+    except OSError as e:
+        print(f"Could not write {meta_path}: {e}")
+        return _metadata_summary(book)
+
+
+class _PdfTextString(str):
+    """Stand-in for PyPDF2's TextStringObject, which older PDF pickles contain."""
+
+
+class BookUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only resolves the reader3 data classes.
+    A book.pkl can't smuggle in arbitrary callables (os.system etc.).
+    Pickles written by the CLI reference these classes via __main__, so that
+    module name is accepted as well.
+    """
+    SAFE_CLASSES = {
+        'Book': Book,
+        'BookMetadata': BookMetadata,
+        'ChapterContent': ChapterContent,
+        'TOCEntry': TOCEntry,
+    }
+
+    def find_class(self, module, name):
+        if module in ('reader3', '__main__') and name in self.SAFE_CLASSES:
+            return self.SAFE_CLASSES[name]
+        if module.startswith('PyPDF2.generic') and name == 'TextStringObject':
+            return _PdfTextString
+        raise pickle.UnpicklingError(f"Refusing to load global {module}.{name}")
+
+
+# Frame header of a zstd-compressed book.pkl; a plain pickle starts with b'\x80'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def load_from_pickle(output_dir: str) -> Book:
+    p_path = os.path.join(output_dir, 'book.pkl')
+    # A book is thousands of small objects; skip GC passes while allocating them
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # mmap: the decompressor/unpickler reads straight from the page cache
+        with open(p_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:4] == ZSTD_MAGIC:
+                return BookUnpickler(io.BytesIO(zstandard.ZstdDecompressor().decompress(mm))).load()
+            # Uncompressed pickle
+            return BookUnpickler(mm).load()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
 
 # --- CLI ---
 
@@ -0,0 +1,82 @@
+"""Static configuration for the Streamlit UI: model menus, model notes and session defaults."""
+
+# Model configurations
+OPENAI_MODELS = {
+    "GPT-5.1 (Reasoning + Agentic)": "gpt-5.1",
+    "GPT-5 Mini": "gpt-5-mini",
+    "GPT-5 Nano": "gpt-5-nano",
+    "GPT-4.1": "gpt-4.1",
+    "GPT-4.1 Mini": "gpt-4.1-mini",
+    "GPT-4.1 Nano": "gpt-4.1-nano",
+    "GPT-4o": "gpt-4o",
+    "GPT-4o Mini": "gpt-4o-mini",
+    "o3 (Reasoning)": "o3",
+    "o4-mini (Reasoning)": "o4-mini",
+    "o4-mini-high (Reasoning)": "o4-mini-high",
+}
+
+GEMINI_MODELS = {
+    "Gemini 3 Pro (Preview)": "gemini-3-pro-preview",
+    "Gemini 2.5 Pro": "gemini-2.5-pro",
+    "Gemini 2.5 Flash": "gemini-2.5-flash",
+    "Gemini 2.5 Flash-Lite": "gemini-2.5-flash-lite",
+    "Gemini 2.0 Flash": "gemini-2.0-flash",
+    "Gemini 2.0 Flash-Lite": "gemini-2.0-flash-lite",
+}
+
+# Display names in menu order, for the model selectboxes
+OPENAI_MODEL_KEYS = list(OPENAI_MODELS)
+GEMINI_MODEL_KEYS = list(GEMINI_MODELS)
+
+# Shown in the sidebar's "Model Information" expander for each provider
+OPENAI_MODEL_INFO = """
+**GPT-5 Family** (Latest): Best for coding and agentic tasks
+- GPT-5.1: Top model with configurable reasoning effort for complex tasks
+- GPT-5 Mini: Faster, cost-efficient for well-defined tasks
+- GPT-5 Nano: Fastest, most cost-efficient version
+
+**GPT-4.1 Family**: Improved coding and instruction following
+- GPT-4.1: Full-featured flagship model
+- GPT-4.1 Mini: Faster, cost-effective version
+- GPT-4.1 Nano: Ultra-fast, budget-friendly
+
+**GPT-4o Family**: Multimodal models with native vision
+- GPT-4o: Versatile omni-model
+- GPT-4o Mini: Quick and economical
+
+**O-Series**: Advanced reasoning models
+- Specialized for complex problem-solving
+- Strong in science, coding, and math
+"""
+
+GEMINI_MODEL_INFO = """
+**Gemini 3 Pro (Preview)**: Latest flagship model
+- 1M token input / 64k token output
+- Advanced reasoning with dynamic thinking
+- Knowledge cutoff: January 2025
+- Supports tools: Google Search, Code Execution
+- Best for complex tasks requiring broad world knowledge
+
+**Gemini 2.5 Family**: State-of-the-art performance
+- Pro: Top thinking model
+- Flash: Best price-performance
+- Flash-Lite: Ultra-fast and cost-efficient
+
+**Gemini 2.0 Family**: Second-gen workhorse
+- Flash: Balanced performance
+- Flash-Lite: Lightweight variant
+
+All models support text, image, video, audio, and PDF inputs
+"""
+
+# Initial st.session_state values, applied with setdefault on every run
+SESSION_DEFAULTS = {
+    "openai_api_key": "",
+    "gemini_api_key": "",
+    "ai_provider": "OpenAI",
+    "selected_model": "",
+    "current_book": None,
+    "current_chapter": 0,
+    "view": "library",
+    "library_dirty": True,
+}
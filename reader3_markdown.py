@@ -0,0 +1,17 @@
+"""Renders Markdown sections to HTML for the upload workers."""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _markdown_renderer():
+    """Fenced code is built in; the chapter HTML is rendered unescaped"""
+    # Imported on first use
+    import mistune
+    return mistune.create_markdown(plugins=["table", "strikethrough"], escape=False)
+
+
+@lru_cache(maxsize=256)
+def render_markdown(md_text: str) -> str:
+    """Render Markdown to HTML, reusing the result for identical sections"""
+    return _markdown_renderer()(md_text)
@@ -1,5 +1,4 @@
 import os
-import pickle
 from functools import lru_cache
 from typing import Optional
 
@@ -8,7 +7,7 @@ from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from reader3 import Book, BookMetadata, ChapterContent, TOCEntry
+from reader3 import Book, BookMetadata, ChapterContent, TOCEntry, load_from_pickle, load_metadata_sidecar, load_chapter
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -17,40 +16,49 @@ templates = Jinja2Templates(directory="templates")
 BOOKS_DIR = "."
 
 @lru_cache(maxsize=10)
-def load_book_cached(folder_name: str) -> Optional[Book]:
+def _load_book(folder_name: str, mtime: float) -> Optional[Book]:
     """
     Loads the book from the pickle file.
-    Cached so we don't re-read the disk on every click.
+    mtime is part of the cache key, so a reprocessed book is read again.
     """
-    file_path = os.path.join(BOOKS_DIR, folder_name, "book.pkl")
-    if not os.path.exists(file_path):
-        return None
-
     try:
-        with open(file_path, "rb") as f:
-            book = pickle.load(f)
-        return book
+        return load_from_pickle(os.path.join(BOOKS_DIR, folder_name))
     except Exception as e:
         print(f"Error loading book {folder_name}: {e}")
         return None
 
+def load_book_cached(folder_name: str) -> Optional[Book]:
+    """
+    Cached so we don't re-read the disk on every click.
+    """
+    file_path = os.path.join(BOOKS_DIR, folder_name, "book.pkl")
+    try:
+        mtime = os.stat(file_path).st_mtime
+    except OSError:
+        return None
+    return _load_book(folder_name, mtime)
+
 @app.get("/", response_class=HTMLResponse)
 async def library_view(request: Request):
     """Lists all available processed books."""
     books = []
 
-    # Scan directory for folders ending in '_data' that have a book.pkl
+    # Scan directory for folders ending in '_data' that have a book
     if os.path.exists(BOOKS_DIR):
         for item in os.listdir(BOOKS_DIR):
             if item.endswith("_data") and os.path.isdir(item):
-                # Try to load it to get the title
-                book = load_book_cached(item)
-                if book:
+                # The meta.json sidecar is enough for the listing
+                try:
+                    meta = load_metadata_sidecar(os.path.join(BOOKS_DIR, item))
+                except Exception as e:
+                    print(f"Error loading book {item}: {e}")
+                    continue
+                if meta:
                     books.append({
                         "id": item,
-                        "title": book.metadata.title,
-                        "author": ", ".join(book.metadata.authors),
-                        "chapters": len(book.spine)
+                        "title": meta["title"],
+                        "author": ", ".join(meta["authors"]),
+                        "chapters": meta["n_chapters"]
                     })
 
     return templates.TemplateResponse("library.html", {"request": request, "books": books})
@@ -70,7 +78,7 @@ async def read_chapter(request: Request, book_id: str, chapter_index: int):
     if chapter_index < 0 or chapter_index >= len(book.spine):
         raise HTTPException(status_code=404, detail="Chapter not found")
 
-    current_chapter = book.spine[chapter_index]
+    current_chapter = load_chapter(os.path.join(BOOKS_DIR, book_id), book, chapter_index)
 
     # Calculate Prev/Next links
     prev_idx = chapter_index - 1 if chapter_index > 0 else None